@@ -4,7 +4,6 @@ const { spawn } = require('child_process');
 const path = require('path');
 const fs = require('fs');
 const os = require('os');
-const { readFileSync } = require('node:fs');
 const { imageSize } = require('image-size');
 
 
@@ -13,6 +12,7 @@ const { imageSize } = require('image-size');
 const CONFIG = {
     facefusionPath: process.platform === 'win32' ? 'C:\\FaceFusion\\3.1.2' : path.join(os.homedir(), 'code', 'facefusion', 'facefusion'),
     sourceImage: null,
+    sourceDimensions: null,
     sourceDir: 'C:\\Users\\banks\\Desktop\\data\\src',
     targetDir: 'C:\\Users\\banks\\Desktop\\data\\trgt',
     outputDir: 'C:\\Users\\banks\\Desktop\\data\\out',
@@ -23,6 +23,9 @@ const CONFIG = {
     processors: ['face_swapper', 'frame_enhancer', 'face_enhancer'],
     //agemodifierdirection: -50, // -100 to 100 with 0 as default
     //faceEditorEyeOpenRatio: 0, //-1 to 1 with 0 as default
+    faceSwapperModel: null, // null leaves the model to facefusion.ini or FaceFusion's own default
+    gpuFp16: false, // inswapper_128_fp16 on GPU providers, overrides facefusion.ini (--fp16)
+    forceFp32: false, // inswapper_128 for bit-exact FP32 output, overrides facefusion.ini (--force-fp32)
     faceSwapperPixelBoost: '1024x1024',
     frameEnhancerModel: 'real_esrgan_x4_fp16',
     executionProviders: process.platform === 'win32' ? ['tensorrt'] : ['cpu'],
@@ -34,21 +37,62 @@ const CONFIG = {
     //faceselectorgender: 'female', // female or male
     //faceMaskBlur: 0.3, //0.3 should be default
     referenceFacePosition: 0, // 0 default, next face would be 1
+    workerCount: null, // null picks a default for the execution providers, see getWorkerCount()
+    chunkSize: null, // images per FaceFusion job, models are loaded once per job; null picks a default, see getChunkSize()
+    gpuBatchSize: 16, // images per FaceFusion job on GPU execution providers when chunkSize is not set
+    jobsPath: null, // temporary FaceFusion jobs directory, created per batch
     
 };
 
-// Ensure output directory exists
-if (!fs.existsSync(CONFIG.outputDir)) {
-    fs.mkdirSync(CONFIG.outputDir, { recursive: true });
+const GPU_PROVIDERS = ['cuda', 'tensorrt', 'rocm', 'directml'];
+
+function usesGpuProvider() {
+    return CONFIG.executionProviders.some(p => GPU_PROVIDERS.includes(p));
 }
 
+// How many images ahead of the workers are read from disk in the background
+const PREFETCH_DEPTH = 8;
+
+// Images per FaceFusion job on CPU providers when chunkSize is not set
+const CPU_CHUNK_SIZE = 32;
+
+// Errors ONNX Runtime and CUDA report when a run did not fit in (GPU) memory
+const OUT_OF_MEMORY_PATTERN = /out of memory|failed to allocate memory|ALLOC_FAILED|bad_alloc|MemoryError/i;
+
+const IMAGE_EXTENSIONS = new Set(['.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.webp']);
+
+// Whether a file name has one of the image extensions, without building a path
+function isImageName(name) {
+    const dot = name.lastIndexOf('.');
+    return dot > 0 && IMAGE_EXTENSIONS.has(name.slice(dot).toLowerCase());
+}
+
+// Ensure output directory exists, this is a no-op when it already does
+fs.mkdirSync(CONFIG.outputDir, { recursive: true });
+
+const statCache = new Map();
+
+// Stat a path at most once per run, null when it cannot be accessed
+function statPath(filePath) {
+    if (!statCache.has(filePath)) {
+        let stats = null;
+        try {
+            stats = fs.statSync(filePath, { throwIfNoEntry: false }) || null;
+        } catch (error) {
+            // Unreadable paths are treated as missing
+        }
+        statCache.set(filePath, stats);
+    }
+    return statCache.get(filePath);
+}
 
 // Get the source image from the data/src directory
 function getSourceImage() {
     const srcDir = CONFIG.sourceDir;
 
     try {
-        const files = fs.readdirSync(srcDir);
+        // Skip stray non-image files such as desktop.ini or .DS_Store
+        const files = fs.readdirSync(srcDir).filter(isImageName);
 
         if (files.length > 0) {
             return path.join(srcDir, files[0]);
@@ -59,127 +103,638 @@ function getSourceImage() {
     return null;
 }
 
-// Get all image files from target directory
+let targetImagesCache = null;
+
+// Get all image files from target directory, scanning it only once per run
 function getTargetImages() {
-    const imageExtensions = ['.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.webp'];
-    
+    if (targetImagesCache) {
+        return targetImagesCache;
+    }
+
     try {
-        const files = fs.readdirSync(CONFIG.targetDir);
-        return files.filter(file => {
-            const ext = path.extname(file).toLowerCase();
-            return imageExtensions.includes(ext);
-        }).map(file => path.join(CONFIG.targetDir, file));
+        // Directory entries carry their type, which filters out directories and
+        // other names before the one stat per image that reads its size
+        const entries = fs.readdirSync(CONFIG.targetDir, { withFileTypes: true });
+        const images = [];
+        for (const entry of entries) {
+            if ((!entry.isFile() && !entry.isSymbolicLink()) || !isImageName(entry.name)) {
+                continue;
+            }
+
+            const imagePath = path.join(CONFIG.targetDir, entry.name);
+            // The stat follows symlinks, so dangling links and links to directories are skipped here
+            const stats = fs.statSync(imagePath, { throwIfNoEntry: false });
+            if (!stats || !stats.isFile()) {
+                console.log(`Skipping ${entry.name}: not a readable image file`);
+                continue;
+            }
+            images.push({ imagePath, size: stats.size });
+        }
+
+        // Order by file size so each job gets images of similar resolution
+        images.sort((a, b) => a.size - b.size || a.imagePath.localeCompare(b.imagePath));
+        targetImagesCache = images.map(image => image.imagePath);
+        return targetImagesCache;
     } catch (error) {
         console.error(`Error reading target directory: ${error.message}`);
         return [];
     }
 }
 
-// Process a single image
-function processImage(targetImage) {
-    return new Promise((resolve, reject) => {
-        const targetName = path.basename(targetImage);
-        //const outputName = targetName.replace(path.extname(targetName), '_processed' + path.extname(targetName));
-        const outputName = targetName.replace(path.extname(targetName) + path.extname(targetName));
-        const outputPath = path.join(CONFIG.outputDir, outputName);
-        
-        console.log(`Processing: ${targetName}`);
-
-        
-        // Get image dimensions
-        const buffer = readFileSync(targetImage)
-        const dimensions = imageSize(buffer)
-
-        let processors = CONFIG.processors;
-        if (dimensions.width > 3840 || dimensions.height > 2160) {
-            processors = processors.filter(p => p !== 'frame_enhancer');
-            console.log(`  Image dimensions (${dimensions.width}x${dimensions.height}) exceed 3840x2160, skipping frame_enhancer.`);
-        }
+// Marker echoed by the worker shell after every command, followed by its exit code
+const DONE_MARKER = '__FFAUTO_DONE__';
+const DONE_MARKER_BYTES = Buffer.from(DONE_MARKER);
+const NEWLINE = 0x0a;
+const NULL_DEVICE = process.platform === 'win32' ? 'NUL' : '/dev/null';
 
-        // Build command arguments
-        const args = [
-            'facefusion.py',
-            'headless-run',
-            '--source', CONFIG.sourceImage,
-            '--target', targetImage,
-            '--output-path', outputPath,
-            '--processors', ...processors,
-            '--face-swapper-pixel-boost', CONFIG.faceSwapperPixelBoost,
-            '--frame-enhancer-model', CONFIG.frameEnhancerModel.toString(),
-            '--execution-providers', ...CONFIG.executionProviders,
-            '--execution-thread-count', CONFIG.executionThreadCount.toString(),
-            '--face-mask-types', ...CONFIG.faceMaskTypes,
-            '--face-detector-angles', ...CONFIG.faceDetectorAngles.map(a => a.toString()),
-            //'--face-mask-blur', CONFIG.faceMaskBlur.toString(),
-            '--reference-face-position', CONFIG.referenceFacePosition.toString(),
-            //'--face-selector-gender', CONFIG.faceselectorgender.toString(),
-            //'--face-editor-eye-open-ratio', CONFIG.faceEditorEyeOpenRatio.toString(),
-            //'--age-modifier-direction', CONFIG.agemodifierdirection.toString(),
-            //'--output-image-resolution', CONFIG.outputimageresolution.toString(),
-        ];
+// Only the end of stderr is kept per command, that is where FaceFusion reports errors
+const STDERR_TAIL_LENGTH = 2000;
+// Longest unterminated stdout line held while waiting for the marker
+const STDOUT_LINE_LIMIT = 64 * 1024;
 
-console.log(args.join(' ')); // Debugging output to see the command being run
-        
-        // Construct the command to activate conda and run facefusion
-        const command = process.platform === 'win32' 
-            ? `conda activate ${CONFIG.condaEnv} && cd ${CONFIG.facefusionPath} && python ${args.join(' ')}`
-            : `source $(conda info --base)/etc/profile.d/conda.sh && conda activate ${CONFIG.condaEnv} && cd ${CONFIG.facefusionPath} && python ${args.join(' ')}`;
-
-        console.log(`Executing command: ${command}`);
-        
-        const shell = process.platform === 'win32' ? 'cmd.exe' : '/bin/bash';
-        const shellArgs = process.platform === 'win32' ? ['/c', command] : ['-c', command];
-        
-        const child = spawn(shell, shellArgs, {
-            stdio: 'pipe',
-            shell: false
-        });
-        
-        let stdout = '';
-        let stderr = '';
-        
-        child.stdout.on('data', (data) => {
-            stdout += data.toString();
-            if (CONFIG.verbose) {
-                process.stdout.write(data);
+// Workers whose shell is still running, killed when the run is interrupted
+const activeWorkers = new Set();
+
+// How long an interrupted run waits for killed workers before removing temporary files
+const WORKER_KILL_TIMEOUT = 2000;
+
+// Start a long-lived shell with the conda environment activated once.
+// Commands are fed over stdin so the shell and conda start-up cost is paid
+// once per batch instead of once per image.
+function createWorker() {
+    const shell = process.platform === 'win32' ? 'cmd.exe' : '/bin/bash';
+    const shellArgs = process.platform === 'win32' ? ['/q'] : [];
+
+    // On POSIX each worker leads its own process group, so an interrupt can
+    // stop the shell together with the FaceFusion run it is waiting on
+    const child = spawn(shell, shellArgs, {
+        stdio: 'pipe',
+        shell: false,
+        detached: process.platform !== 'win32'
+    });
+
+    const worker = { child, pending: null, stdout: Buffer.alloc(0) };
+    worker.exited = new Promise(resolve => child.once('close', resolve));
+    activeWorkers.add(worker);
+
+    // Output is handled as raw bytes, only the stderr tail of a failure is ever decoded
+    child.stdout.on('data', (data) => {
+        worker.stdout = worker.stdout.length > 0 ? Buffer.concat([worker.stdout, data]) : data;
+
+        let lineEnd;
+        while ((lineEnd = worker.stdout.indexOf(NEWLINE)) !== -1) {
+            const line = worker.stdout.subarray(0, lineEnd);
+            worker.stdout = worker.stdout.subarray(lineEnd + 1);
+
+            // The marker may follow output that did not end with a line break
+            const markerIndex = line.indexOf(DONE_MARKER_BYTES);
+            if (CONFIG.verbose && markerIndex !== 0) {
+                process.stdout.write(markerIndex === -1 ? line : line.subarray(0, markerIndex));
+                process.stdout.write('\n');
             }
-        });
-        
-        child.stderr.on('data', (data) => {
-            stderr += data.toString();
+            if (markerIndex !== -1) {
+                const pending = worker.pending;
+                worker.pending = null;
+                if (pending) {
+                    const code = parseInt(line.toString('latin1', markerIndex + DONE_MARKER_BYTES.length), 10);
+                    pending.resolve({ code, stderr: pending.stderr });
+                }
+            }
+        }
+
+        // Output without line breaks is streamed through instead of piling up
+        if (worker.stdout.length > STDOUT_LINE_LIMIT) {
             if (CONFIG.verbose) {
-                process.stderr.write(data);
+                process.stdout.write(worker.stdout.subarray(0, -DONE_MARKER_BYTES.length));
             }
-        });
-        
-        child.on('close', (code) => {
-            if (code === 0) {
-                console.log(`  ✅ Success: ${targetName} -> ${outputName}`);
-                resolve({ success: true, target: targetName, output: outputName });
-            } else {
-                console.error(`  ❌ Failed: ${targetName} (exit code: ${code})`);
-                if (stderr) {
-                    console.error(`     Error: ${stderr.slice(0, 200)}`);
-                }
-                resolve({ success: false, target: targetName, error: stderr });
+            worker.stdout = worker.stdout.subarray(-DONE_MARKER_BYTES.length);
+        }
+    });
+
+    child.stderr.on('data', (data) => {
+        if (worker.pending) {
+            const stderr = Buffer.concat([worker.pending.stderr, data]);
+            worker.pending.stderr = stderr.subarray(-STDERR_TAIL_LENGTH);
+        }
+        if (CONFIG.verbose) {
+            process.stderr.write(data);
+        }
+    });
+
+    const fail = (error) => {
+        worker.closed = true;
+        const pending = worker.pending;
+        worker.pending = null;
+        if (pending) {
+            pending.resolve({ code: null, stderr: pending.stderr, error });
+        }
+    };
+
+    child.on('close', (code) => {
+        activeWorkers.delete(worker);
+        fail(`worker exited (exit code: ${code})`);
+    });
+    child.on('error', (error) => fail(error.message));
+
+    return worker;
+}
+
+// Run one command on the worker and resolve with its exit code once the marker arrives
+function runOnWorker(worker, command) {
+    return new Promise((resolve) => {
+        if (worker.closed) {
+            resolve({ code: null, stderr: Buffer.alloc(0), error: 'worker is not running' });
+            return;
+        }
+
+        const exitCode = process.platform === 'win32' ? '%ERRORLEVEL%' : '$?';
+        worker.pending = { resolve, stderr: Buffer.alloc(0) };
+        worker.child.stdin.write(`${command}\necho ${DONE_MARKER} ${exitCode}\n`);
+    });
+}
+
+// Activate conda and enter the FaceFusion directory on a fresh worker
+async function startWorker() {
+    const worker = createWorker();
+    const setup = process.platform === 'win32'
+        ? `call conda activate ${CONFIG.condaEnv} && cd /d ${CONFIG.facefusionPath}`
+        : `source $(conda info --base)/etc/profile.d/conda.sh && conda activate ${CONFIG.condaEnv} && cd ${CONFIG.facefusionPath}`;
+
+    const { code, stderr, error } = await runOnWorker(worker, setup);
+    if (error || code !== 0) {
+        stopWorker(worker);
+        throw new Error(`Failed to start FaceFusion worker: ${error || stderr.subarray(-200).toString('utf8') || `exit code ${code}`}`);
+    }
+    return worker;
+}
+
+function stopWorker(worker) {
+    if (!worker.closed) {
+        worker.child.stdin.end();
+    }
+}
+
+// Kill a worker and whatever it is running right now
+function killWorker(worker) {
+    try {
+        if (process.platform === 'win32') {
+            worker.child.kill();
+        } else {
+            process.kill(-worker.child.pid, 'SIGTERM');
+        }
+    } catch (error) {
+        // The worker has already exited
+    }
+}
+
+// Start the worker pool; when any worker fails to start, the ones that did are
+// stopped again so their shells do not keep the process alive
+async function startWorkers(count) {
+    const started = await Promise.allSettled(Array.from({ length: count }, startWorker));
+    const workers = started.filter(r => r.status === 'fulfilled').map(r => r.value);
+    const failure = started.find(r => r.status === 'rejected');
+    if (failure) {
+        workers.forEach(stopWorker);
+        throw failure.reason;
+    }
+    return workers;
+}
+
+// Workers whose shell is still running
+function getLiveWorkers(workers) {
+    return workers.filter(worker => !worker.closed);
+}
+
+// Number of FaceFusion workers to run side by side
+function getWorkerCount() {
+    if (CONFIG.workerCount) {
+        return CONFIG.workerCount;
+    }
+    if (CONFIG.executionProviders.includes('openvino')) {
+        return 1;
+    }
+    // One worker feeds the GPU while the other loads and saves images
+    if (usesGpuProvider()) {
+        return 2;
+    }
+    // Each CPU worker already runs executionThreadCount threads
+    return Math.max(1, Math.floor(os.cpus().length / CONFIG.executionThreadCount));
+}
+
+// Images per FaceFusion job, an explicit chunk size wins over the provider defaults
+function getChunkSize() {
+    if (CONFIG.chunkSize) {
+        return CONFIG.chunkSize;
+    }
+    // GPU jobs are kept smaller so both GPU workers stay busy until the end of the batch
+    if (usesGpuProvider()) {
+        return CONFIG.gpuBatchSize;
+    }
+    return CPU_CHUNK_SIZE;
+}
+
+// Process images on the worker pool in chunks, each worker pulling the next chunk when it is free.
+// Without a job template every image gets its own headless-run.
+async function processOnPool(workers, images, label, chunkSize, jobTemplate = null) {
+    const results = new Array(images.length);
+    const requeued = [];
+    let next = 0;
+    let chunkCount = 0;
+
+    // Images put back by a failed job go first, then the next slice of the list
+    const takeChunk = () => {
+        if (requeued.length > 0) {
+            return requeued.shift();
+        }
+        const indices = [];
+        while (indices.length < (jobTemplate ? chunkSize : 1) && next < images.length) {
+            indices.push(next++);
+        }
+        return indices;
+    };
+
+    const hasWork = () => next < images.length || requeued.length > 0;
+
+    // A worker whose shell has exited stops taking chunks and leaves them to the others
+    const runWorker = async (worker) => {
+        while (!worker.closed && hasWork()) {
+            const indices = takeChunk();
+            const chunk = indices.map(i => images[i]);
+
+            // Read the next images while FaceFusion works on this chunk
+            images.slice(next, next + PREFETCH_DEPTH).forEach(loadDimensions);
+
+            console.log(chunk.length > 1
+                ? `[${label}${indices[0] + 1}-${indices[indices.length - 1] + 1}/${images.length}] ${chunk.length} images`
+                : `[${label}${indices[0] + 1}/${images.length}] ${path.basename(chunk[0])}`);
+
+            if (chunk.length === 1) {
+                results[indices[0]] = await processImage(worker, chunk[0]);
+                continue;
+            }
+
+            // Images a failed job did not get to come back as null and are queued again together
+            const chunkResults = await processChunk(worker, chunk, `ffauto-${process.pid}-${chunkCount++}`, jobTemplate);
+            const putBack = indices.filter((index, i) => {
+                results[index] = chunkResults[i];
+                return chunkResults[i] === null;
+            });
+            if (putBack.length > 0) {
+                console.log(`  ↩️  Queueing ${putBack.length} images from the failed job again`);
+                requeued.push(putBack);
+            }
+        }
+    };
+
+    // Chunks handed back by a worker that died after the others ran out of work get another round
+    let liveWorkers = getLiveWorkers(workers);
+    while (hasWork() && liveWorkers.length > 0) {
+        await Promise.all(liveWorkers.map(runWorker));
+        liveWorkers = getLiveWorkers(liveWorkers);
+    }
+
+    if (hasWork()) {
+        throw new Error('Every FaceFusion worker has exited, the batch cannot continue');
+    }
+
+    return results;
+}
+
+const dimensionCache = new Map();
+
+// Bytes read from the start of an image to find its dimensions
+const HEADER_PROBE_SIZE = 64 * 1024;
+
+// Dimensions sit in the image header, so only its first bytes are read; images
+// whose header does not fit (e.g. JPEGs with a large EXIF block) are read whole
+async function probeDimensions(imagePath) {
+    const handle = await fs.promises.open(imagePath, 'r');
+    let header;
+    try {
+        const { buffer, bytesRead } = await handle.read(Buffer.alloc(HEADER_PROBE_SIZE), 0, HEADER_PROBE_SIZE, 0);
+        header = buffer.subarray(0, bytesRead);
+    } finally {
+        await handle.close();
+    }
+
+    try {
+        return imageSize(header);
+    } catch (error) {
+        if (header.length < HEADER_PROBE_SIZE) {
+            throw error;
+        }
+    }
+    return imageSize(await fs.promises.readFile(imagePath));
+}
+
+// Read an image in the background and keep only its dimensions, so disk
+// reads overlap with the FaceFusion run of the previous chunk
+function loadDimensions(targetImage) {
+    if (!dimensionCache.has(targetImage)) {
+        const dimensions = probeDimensions(targetImage);
+        // Errors are reported when the image is processed, not when it is prefetched.
+        // A failed read is not cached, so the retry pass reads the file again.
+        dimensions.catch(() => {
+            if (dimensionCache.get(targetImage) === dimensions) {
+                dimensionCache.delete(targetImage);
             }
         });
-        
-        child.on('error', (error) => {
-            console.error(`  ❌ Error processing ${targetName}: ${error.message}`);
-            resolve({ success: false, target: targetName, error: error.message });
-        });
+        dimensionCache.set(targetImage, dimensions);
+    }
+    return dimensionCache.get(targetImage);
+}
+
+// Processors for a target, skipping frame_enhancer on images that are already large
+async function getProcessors(targetImage) {
+    // Get image dimensions
+    const dimensions = await loadDimensions(targetImage);
+
+    let processors = CONFIG.processors;
+    if (dimensions.width > 3840 || dimensions.height > 2160) {
+        processors = processors.filter(p => p !== 'frame_enhancer');
+        console.log(`  Image dimensions (${dimensions.width}x${dimensions.height}) exceed 3840x2160, skipping frame_enhancer.`);
+    }
+    return processors;
+}
+
+// Arguments describing a single source -> target step
+async function buildStepArgs(targetImage, outputPath) {
+    const processors = await getProcessors(targetImage);
+    return [
+        '--target', targetImage,
+        '--output-path', outputPath,
+        '--processors', ...processors,
+        ...getSharedStepArgs(),
+    ];
+}
+
+let sharedStepArgs = null;
+
+// Step arguments that are the same for every target, built once per run
+function getSharedStepArgs() {
+    if (sharedStepArgs) {
+        return sharedStepArgs;
+    }
+    sharedStepArgs = [
+        '--source', CONFIG.sourceImage,
+        ...(CONFIG.faceSwapperModel ? ['--face-swapper-model', CONFIG.faceSwapperModel] : []),
+        '--face-swapper-pixel-boost', CONFIG.faceSwapperPixelBoost,
+        '--frame-enhancer-model', CONFIG.frameEnhancerModel.toString(),
+        '--face-mask-types', ...CONFIG.faceMaskTypes,
+        '--face-detector-angles', ...CONFIG.faceDetectorAngles.map(a => a.toString()),
+        //'--face-mask-blur', CONFIG.faceMaskBlur.toString(),
+        '--reference-face-position', CONFIG.referenceFacePosition.toString(),
+        //'--face-selector-gender', CONFIG.faceselectorgender.toString(),
+        //'--face-editor-eye-open-ratio', CONFIG.faceEditorEyeOpenRatio.toString(),
+        //'--age-modifier-direction', CONFIG.agemodifierdirection.toString(),
+        //'--output-image-resolution', CONFIG.outputimageresolution.toString(),
+    ];
+    return sharedStepArgs;
+}
+
+let executionArgs = null;
+
+// Arguments for the process that actually runs the models, built once per run
+function buildExecutionArgs() {
+    if (!executionArgs) {
+        executionArgs = [
+            '--execution-providers', ...CONFIG.executionProviders,
+            '--execution-thread-count', CONFIG.executionThreadCount.toString(),
+        ];
+    }
+    return executionArgs;
+}
+
+// Run facefusion.py with the given arguments on a worker
+function runFacefusion(worker, args) {
+    // Stdin is detached so facefusion can never swallow the worker's queued commands
+    const command = `python facefusion.py ${args.join(' ')} < ${NULL_DEVICE}`;
+
+    console.log(`Executing command: ${command}`);
+
+    return runOnWorker(worker, command);
+}
+
+// Names of the files already in the output directory
+function getExistingOutputs() {
+    try {
+        const entries = fs.readdirSync(CONFIG.outputDir, { withFileTypes: true });
+        return new Set(entries.filter(entry => entry.isFile()).map(entry => entry.name));
+    } catch (error) {
+        console.error(`Error reading output directory: ${error.message}`);
+        return new Set();
+    }
+}
+
+// Outputs keep the target's file name
+function getOutputName(targetName) {
+    //return targetName.replace(path.extname(targetName), '_processed' + path.extname(targetName));
+    return targetName;
+}
+
+// FaceFusion writes next to the final output under a temporary name that keeps
+// the extension, since FaceFusion picks the image format from it
+function getPartialPath(outputPath) {
+    const ext = path.extname(outputPath);
+    return path.join(path.dirname(outputPath), `.${path.basename(outputPath, ext)}.part${ext}`);
+}
+
+// Move a finished output into place, the rename fails when nothing was written
+function commitOutput(partialPath, outputPath) {
+    try {
+        fs.renameSync(partialPath, outputPath);
+        return { code: 0 };
+    } catch (error) {
+        return { error: `No output was written (${error.code})` };
+    }
+}
+
+// Remove whatever a failed run left behind and pass its outcome on
+function discardOutput(partialPath, outcome) {
+    fs.rmSync(partialPath, { force: true });
+    return outcome;
+}
+
+// Turn a finished FaceFusion run into a result entry and report it
+function toResult(targetName, outputName, { code, stderr, error }) {
+    if (error) {
+        console.error(`  ❌ Error processing ${targetName}: ${error}`);
+        return { success: false, target: targetName, error };
+    }
+    if (code === 0) {
+        console.log(`  ✅ Success: ${targetName} -> ${outputName}`);
+        return { success: true, target: targetName, output: outputName };
+    }
+    // The stderr tail is kept as raw bytes and only decoded for failures
+    const message = stderr ? stderr.toString('utf8') : '';
+    console.error(`  ❌ Failed: ${targetName} (exit code: ${code})`);
+    if (message) {
+        console.error(`     Error: ${message.slice(-200)}`);
+    }
+    return { success: false, target: targetName, error: message, outOfMemory: OUT_OF_MEMORY_PATTERN.test(message) };
+}
+
+// Process a single image
+async function processImage(worker, targetImage) {
+    const targetName = path.basename(targetImage);
+    const outputName = getOutputName(targetName);
+    const outputPath = path.join(CONFIG.outputDir, outputName);
+
+    const partialPath = getPartialPath(outputPath);
+
+    console.log(`Processing: ${targetName}`);
+
+    let stepArgs;
+    try {
+        stepArgs = await buildStepArgs(targetImage, partialPath);
+    } catch (error) {
+        return toResult(targetName, outputName, { error: error.message });
+    }
+
+    const outcome = await runFacefusion(worker, ['headless-run', ...stepArgs, ...buildExecutionArgs()]);
+    return toResult(targetName, outputName, outcome.code === 0
+        ? commitOutput(partialPath, outputPath)
+        : discardOutput(partialPath, outcome));
+}
+
+// FaceFusion fills in every argument a step needs when the step is added through
+// its CLI. One step is added per batch, with the source image standing in as the
+// target, and later jobs are written directly from its arguments, so a chunk
+// costs a single job-run instead of one FaceFusion launch per image.
+// The job file is FaceFusion's own format, not a public interface: this follows
+// the layout of FaceFusion 3.0 to 3.1.2 (the version in facefusionPath). When a
+// release lays it out differently the keys are not found and the batch falls
+// back to one headless-run per image.
+async function createJobTemplate(worker) {
+    const jobId = `ffauto-${process.pid}-template`;
+    const jobArgs = [jobId, '--jobs-path', CONFIG.jobsPath];
+    const placeholderOutput = path.join(CONFIG.jobsPath, `template${path.extname(CONFIG.sourceImage)}`);
+
+    for (const args of [
+        ['job-create', ...jobArgs],
+        ['job-add-step', ...jobArgs, '--target', CONFIG.sourceImage, '--output-path', placeholderOutput, '--processors', ...CONFIG.processors, ...getSharedStepArgs()],
+    ]) {
+        const { code, error } = await runFacefusion(worker, args);
+        if (error || code !== 0) {
+            return null;
+        }
+    }
+
+    let job;
+    try {
+        job = JSON.parse(fs.readFileSync(path.join(CONFIG.jobsPath, 'drafted', `${jobId}.json`), 'utf8'));
+    } catch (error) {
+        return null;
+    }
+
+    // The arguments that differ per image are found by the values they were given
+    const args = job.steps && job.steps[0] && job.steps[0].args;
+    if (!args) {
+        return null;
+    }
+    const findKey = (value) => Object.keys(args).find(key => JSON.stringify(args[key]) === JSON.stringify(value));
+    const keys = { target: findKey(CONFIG.sourceImage), output: findKey(placeholderOutput), processors: findKey(CONFIG.processors) };
+    if (!keys.target || !keys.output || !keys.processors) {
+        return null;
+    }
+
+    return { job, args, keys };
+}
+
+// Read back the job FaceFusion moved to a status folder, null when it is not there
+function readJob(jobId, status) {
+    try {
+        return JSON.parse(fs.readFileSync(path.join(CONFIG.jobsPath, status, `${jobId}.json`), 'utf8'));
+    } catch (error) {
+        return null;
+    }
+}
+
+// Process several images as one FaceFusion job, so the models are loaded
+// once per chunk instead of once per image. Images that have to go into
+// another job because this one failed come back as null.
+async function processChunk(worker, targetImages, jobId, jobTemplate) {
+    const results = new Array(targetImages.length).fill(null);
+    const steps = [];
+
+    await Promise.all(targetImages.map(async (targetImage, i) => {
+        const targetName = path.basename(targetImage);
+        const outputName = getOutputName(targetName);
+        const outputPath = path.join(CONFIG.outputDir, outputName);
+        try {
+            const processors = await getProcessors(targetImage);
+            steps.push({ i, targetImage, targetName, outputName, outputPath, partialPath: getPartialPath(outputPath), processors });
+        } catch (error) {
+            results[i] = toResult(targetName, outputName, { error: error.message });
+        }
+    }));
+
+    if (steps.length === 0) {
+        return results;
+    }
+    steps.sort((a, b) => a.i - b.i);
+
+    const { keys } = jobTemplate;
+    const job = {
+        ...jobTemplate.job,
+        steps: steps.map(step => ({
+            args: { ...jobTemplate.args, [keys.target]: step.targetImage, [keys.output]: step.partialPath, [keys.processors]: step.processors },
+            status: 'queued',
+        })),
+    };
+
+    let outcome;
+    try {
+        fs.mkdirSync(path.join(CONFIG.jobsPath, 'queued'), { recursive: true });
+        fs.writeFileSync(path.join(CONFIG.jobsPath, 'queued', `${jobId}.json`), JSON.stringify(job, null, 4));
+        steps.forEach(step => console.log(`Queueing: ${step.targetName}`));
+        outcome = await runFacefusion(worker, ['job-run', jobId, '--jobs-path', CONFIG.jobsPath, ...buildExecutionArgs()]);
+    } catch (error) {
+        outcome = { error: error.message };
+    }
+
+    if (outcome.code === 0) {
+        for (const step of steps) {
+            results[step.i] = toResult(step.targetName, step.outputName, commitOutput(step.partialPath, step.outputPath));
+        }
+        return results;
+    }
+
+    // FaceFusion removes every step output of a failed job, so only the failing
+    // step is reported; the others are handed back to run in a new job. When the
+    // worker itself died no image is to blame and the whole chunk is handed back.
+    const failedJob = outcome.error ? null : readJob(jobId, 'failed');
+    const failedIndex = failedJob && failedJob.steps ? failedJob.steps.findIndex(step => step.status === 'failed') : -1;
+
+    steps.forEach((step, index) => {
+        discardOutput(step.partialPath, outcome);
+        if (!worker.closed && (failedIndex === -1 || index === failedIndex)) {
+            results[step.i] = toResult(step.targetName, step.outputName, outcome);
+        }
     });
+
+    return results;
+}
+
+// Remove the jobs directory, safe to call more than once
+function cleanUpTempFiles() {
+    if (CONFIG.jobsPath) {
+        fs.rmSync(CONFIG.jobsPath, { recursive: true, force: true });
+    }
+    CONFIG.jobsPath = null;
 }
 
 // Main batch processing function
 async function processBatch() {
     console.log('🚀 Starting FaceFusion Batch Processing');
-    console.log(`   Source: ${path.basename(CONFIG.sourceImage)}`);
+    console.log(`   Source: ${path.basename(CONFIG.sourceImage)} (${CONFIG.sourceDimensions.width}x${CONFIG.sourceDimensions.height})`);
     console.log(`   Target Directory: ${CONFIG.targetDir}`);
     console.log(`   Output Directory: ${CONFIG.outputDir}`);
     console.log(`   Execution Providers: ${CONFIG.executionProviders.join(', ')}`);
     console.log(`   Processors: ${CONFIG.processors.join(', ')}`);
+    console.log(`   Face Swapper Model: ${CONFIG.faceSwapperModel || 'from facefusion.ini or FaceFusion default'}`);
+    console.log(`   Workers: ${getWorkerCount()}`);
+    console.log(`   Images per job: ${getChunkSize()}`);
     console.log('=' .repeat(60));
     
     const targetImages = getTargetImages();
@@ -191,48 +746,75 @@ async function processBatch() {
     
     console.log(`Found ${targetImages.length} target images\n`);
     
-    const startTime = Date.now();
-    const results = [];
-    
-    // Process images sequentially to avoid overwhelming the system
-    for (let i = 0; i < targetImages.length; i++) {
-        console.log(`[${i + 1}/${targetImages.length}] ${path.basename(targetImages[i])}`);
-        const result = await processImage(targetImages[i]);
-        results.push(result);
-        
-        // Small delay between processing
-        if (i < targetImages.length - 1) {
-            await new Promise(resolve => setTimeout(resolve, 500));
+    // Skip images that already have an output, read from a single directory scan
+    const existingOutputs = getExistingOutputs();
+    const skippedResults = [];
+    const pendingImages = targetImages.filter(targetImage => {
+        const targetName = path.basename(targetImage);
+        const outputName = getOutputName(targetName);
+        if (existingOutputs.has(outputName)) {
+            skippedResults.push({ success: true, target: targetName, output: outputName, skipped: true });
+            return false;
         }
+        return true;
+    });
+
+    if (skippedResults.length > 0) {
+        console.log(`Skipping ${skippedResults.length} images that already have an output\n`);
     }
     
-    // Retry failed images once
-    const failedResults = results.filter(r => !r.success);
-    
-    if (failedResults.length > 0) {
-        console.log('\n⚠️  Found failed images. Retrying once...');
-        console.log('=' .repeat(60));
-
-        for (let i = 0; i < failedResults.length; i++) {
-            const failedResult = failedResults[i];
-            const targetPath = path.join(CONFIG.targetDir, failedResult.target);
-            
-            console.log(`[Retry ${i + 1}/${failedResults.length}] ${failedResult.target}`);
-            const retryResult = await processImage(targetPath);
-            
-            // If retry is successful, update the main results array
-            if (retryResult.success) {
-                 const originalIndex = results.findIndex(r => r.target === failedResult.target);
-                 if (originalIndex !== -1) {
-                     results[originalIndex] = retryResult;
-                 }
+    const startTime = Date.now();
+    let workers = [];
+    let results;
+    try {
+        CONFIG.jobsPath = fs.mkdtempSync(path.join(os.tmpdir(), 'ffauto-jobs-'));
+        workers = pendingImages.length > 0
+            ? await startWorkers(getWorkerCount())
+            : [];
+
+        // Without a template every image falls back to its own headless-run
+        const jobTemplate = pendingImages.length > 1 && getChunkSize() > 1
+            ? await createJobTemplate(workers[0])
+            : null;
+        if (pendingImages.length > 1 && getChunkSize() > 1 && !jobTemplate) {
+            console.log('⚠️  Could not prepare a FaceFusion job, processing one image per run');
+        }
+
+        results = [...skippedResults, ...await processOnPool(workers, pendingImages, '', getChunkSize(), jobTemplate)];
+
+        // Retry failed images once
+        const failedResults = results.filter(r => !r.success);
+
+        if (failedResults.length > 0) {
+            console.log('\n⚠️  Found failed images. Retrying once...');
+            console.log('=' .repeat(60));
+
+            const retryPaths = failedResults.filter(r => !r.outOfMemory).map(r => path.join(CONFIG.targetDir, r.target));
+            const outOfMemoryPaths = failedResults.filter(r => r.outOfMemory).map(r => path.join(CONFIG.targetDir, r.target));
+
+            // Retry one image per run so a single bad image cannot fail the others again
+            const retryResults = await processOnPool(getLiveWorkers(workers), retryPaths, 'Retry ', 1);
+
+            // Images that ran out of memory are retried only once the other workers
+            // are idle, on a single live worker, so they have the memory to themselves
+            if (outOfMemoryPaths.length > 0) {
+                console.log(`\n⚠️  ${outOfMemoryPaths.length} images ran out of memory, retrying them one worker at a time...`);
+                retryResults.push(...await processOnPool(getLiveWorkers(workers).slice(0, 1), outOfMemoryPaths, 'Retry ', 1));
             }
 
-            // Small delay between processing
-            if (i < failedResults.length - 1) {
-                await new Promise(resolve => setTimeout(resolve, 500));
+            // If retry is successful, update the main results array
+            for (const retryResult of retryResults) {
+                if (retryResult.success) {
+                     const originalIndex = results.findIndex(r => r.target === retryResult.target);
+                     if (originalIndex !== -1) {
+                         results[originalIndex] = retryResult;
+                     }
+                }
             }
         }
+    } finally {
+        workers.forEach(stopWorker);
+        cleanUpTempFiles();
     }
 
     const elapsedTime = (Date.now() - startTime) / 1000;
@@ -245,6 +827,9 @@ const dump=results;(await import('fs')).writeFileSync('./results.json', JSON.str
     console.log('=' .repeat(60));
     console.log('\n📊 Batch Processing Complete!');
     console.log(`   ✅ Successful: ${successfulCount}/${targetImages.length}`);
+    if (skippedResults.length > 0) {
+        console.log(`   ⏭️  Skipped: ${skippedResults.length}/${targetImages.length}`);
+    }
     if (failedCount > 0) {
         console.log(`   ❌ Failed: ${failedCount}/${targetImages.length}`);
     }
@@ -260,12 +845,45 @@ if (args.includes('--verbose') || args.includes('-v')) {
     CONFIG.verbose = true;
 }
 
+if (args.includes('--fp16')) {
+    CONFIG.gpuFp16 = true;
+}
+
+if (args.includes('--force-fp32')) {
+    CONFIG.forceFp32 = true;
+}
+
+// Read a count option, anything but a whole number of at least 1 is an error
+function getCountOption(name) {
+    const index = args.indexOf(name);
+    if (index === -1) {
+        return null;
+    }
+    const value = args[index + 1];
+    if (!/^[1-9][0-9]*$/.test(value || '')) {
+        console.error(`Error: ${name} expects a whole number of at least 1, got ${value === undefined ? 'nothing' : `'${value}'`}`);
+        process.exit(1);
+    }
+    return parseInt(value, 10);
+}
+
+CONFIG.workerCount = getCountOption('--workers') || CONFIG.workerCount;
+CONFIG.gpuBatchSize = getCountOption('--gpu-batch-size') || CONFIG.gpuBatchSize;
+CONFIG.chunkSize = getCountOption('--chunk-size') || CONFIG.chunkSize;
+
 if (args.includes('--help') || args.includes('-h')) {
     console.log(`
 Usage: node batch_process.js [options]
 
 Options:
   -v, --verbose    Show verbose output
+  --workers <n>    Number of FaceFusion workers to run in parallel
+  --chunk-size <n> Number of images processed per FaceFusion job, on any provider
+  --gpu-batch-size <n>
+                   Number of images per FaceFusion job on GPU providers when
+                   --chunk-size is not given
+  --fp16           Use inswapper_128_fp16 on GPU providers, overrides facefusion.ini
+  --force-fp32     Use inswapper_128 for bit-exact FP32 output, overrides facefusion.ini
   -h, --help       Show this help message
 
 Configuration:
@@ -277,26 +895,73 @@ Current configuration:
   - Target Directory: ${CONFIG.targetDir}
   - Output Directory: ${CONFIG.outputDir}
   - Conda Environment: ${CONFIG.condaEnv}
+  - Workers: ${getWorkerCount()}
 `);
     process.exit(0);
 }
 
+// This script cannot see facefusion.ini, so the model is only switched on request.
+// FaceFusion's own default is the FP16 inswapper, so FP32 has to be named explicitly.
+if (CONFIG.gpuFp16 && CONFIG.forceFp32) {
+    console.error('Error: --fp16 and --force-fp32 cannot be used together');
+    process.exit(1);
+}
+if (CONFIG.forceFp32) {
+    CONFIG.faceSwapperModel = 'inswapper_128';
+    console.log('Using inswapper_128 (FP32), this overrides the face swapper model in facefusion.ini');
+} else if (CONFIG.gpuFp16 && [null, 'inswapper_128'].includes(CONFIG.faceSwapperModel) && usesGpuProvider()) {
+    // Half precision halves memory traffic on GPU providers
+    CONFIG.faceSwapperModel = 'inswapper_128_fp16';
+    console.log('Using inswapper_128_fp16 on GPU, this overrides the face swapper model in facefusion.ini');
+}
+
 // Set the source image
 CONFIG.sourceImage = getSourceImage();
 
-// Check if source image exists
-if (!CONFIG.sourceImage || !fs.existsSync(CONFIG.sourceImage)) {
+// Check if source image exists, it came from the directory listing so decoding it below is the real check
+if (!CONFIG.sourceImage) {
     console.error(`Error: Source image not found in ${path.join(__dirname, 'data', 'src')}`);
     process.exit(1);
 }
 
+// Decode the source once up front, every job shares it and a broken source would fail them all
+try {
+    CONFIG.sourceDimensions = imageSize(fs.readFileSync(CONFIG.sourceImage));
+} catch (error) {
+    console.error(`Error: Source image could not be read: ${error.message}`);
+    process.exit(1);
+}
+
 // Check if target directory exists
-if (!fs.existsSync(CONFIG.targetDir)) {
+if (!statPath(CONFIG.targetDir)?.isDirectory()) {
     console.error(`Error: Target directory not found: ${CONFIG.targetDir}`);
     process.exit(1);
 }
 
+// One stat of facefusion.py covers both a missing installation and a wrong path
+if (!statPath(path.join(CONFIG.facefusionPath, 'facefusion.py'))) {
+    console.error(`Error: facefusion.py not found in ${CONFIG.facefusionPath}`);
+    process.exit(1);
+}
+
+// Interrupted runs must not leave the jobs directory behind
+for (const signal of ['SIGINT', 'SIGTERM']) {
+    process.on(signal, async () => {
+        console.error(`\nInterrupted by ${signal}, cleaning up...`);
+        // Running FaceFusion processes are stopped first so they cannot write into the jobs directory afterwards
+        const workers = [...activeWorkers];
+        workers.forEach(killWorker);
+        await Promise.race([
+            Promise.all(workers.map(worker => worker.exited)),
+            new Promise(resolve => setTimeout(resolve, WORKER_KILL_TIMEOUT)),
+        ]);
+        cleanUpTempFiles();
+        process.exit(128 + os.constants.signals[signal]);
+    });
+}
+
 // Run batch processing
 processBatch().catch(error => {
     console.error(`Unexpected error: ${error.message}`);
+    process.exit(1);
 });